@@ -6,17 +6,21 @@ Your goal is to implement the functions and methods required to enable choose_ac
 Original Mario Manual: https://www.thegameisafootarcade.com/wp-content/uploads/2017/04/Super-Mario-Land-Game-Manual.pdf
 """
 
+import inspect
 import json
 import logging
-import random
 
 import cv2
 from mario_environment import MarioEnvironment
 from pyboy.utils import WindowEvent
 import numpy as np
-import math
-import time
 
+class ACTIONCODE:
+    forward = 0
+    jump = 1
+    long_jump = 2
+    back = 3
+    no_action = 4
 class ACTIONDURATION:
     short = 1
     medium = 6
@@ -34,6 +38,119 @@ class GameElements:
         JUMPING_MOB = 18
         FLYING_MOB = 19
 
+        # Elements located by choose_action each tick
+        TRACKED = (GOOMBA, KOOPA, BLOCK, JUMPING_MOB, FLYING_MOB)
+
+
+# The compressed game area is always 16 rows by 20 columns
+GA_H, GA_W = 16, 20
+
+MARIO_POV = 2
+
+# (element, min tiles ahead, max tiles ahead, rows above/below Mario, action, duration)
+# Enemy rules are checked in order before pipes and holes - the first rule that matches wins
+ENEMY_RULES = (
+    (GameElements.GOOMBA, 1, MARIO_POV, 1, ACTIONCODE.long_jump, ACTIONDURATION.long),
+    (GameElements.KOOPA, 1, MARIO_POV, 1, ACTIONCODE.long_jump, ACTIONDURATION.medium),
+    (GameElements.JUMPING_MOB, 1, MARIO_POV + 2, 2, ACTIONCODE.jump, ACTIONDURATION.medium),
+)
+# Block directly in front of Mario (obstacle) - checked last
+BLOCK_RULE = (GameElements.BLOCK, MARIO_POV, MARIO_POV, 1, ACTIONCODE.long_jump, ACTIONDURATION.short)
+
+
+def first_position(game_area: np.ndarray, element: int, mask: np.ndarray):
+    """
+    Returns the (x, y) of the first cell holding element in row-major order, or None if it is not on screen.
+
+    mask is a bool scratch buffer the same shape as game_area - its contents are overwritten.
+    """
+    np.equal(game_area, element, out=mask)
+    index = int(mask.argmax())
+    if game_area.flat[index] != element:
+        return None
+    y, x = divmod(index, GA_W)
+    return x, y
+
+
+def rule_matches(positions: dict, rule: tuple, mario_x: int, mario_y: int) -> bool:
+    """
+    Checks whether any element covered by rule lies inside its window relative to Mario.
+    """
+    element, dx_min, dx_max, dy, _, _ = rule
+    xs, ys = positions[element]
+    dx = xs - mario_x
+    dy_cells = ys - mario_y
+    hit = (dx >= dx_min) & (dx <= dx_max) & ((dy_cells == dy) | (dy_cells == -dy))
+    return bool(hit.any())
+
+
+def decide_action(game_area: np.ndarray, mask: np.ndarray) -> tuple[int, int]:
+    """
+    Decides what Mario should do next based purely on the current game area.
+
+    Args:
+        game_area (np.ndarray): The compressed game area grid from the environment, as int8.
+        mask (np.ndarray): Bool scratch buffer the same shape as game_area, reused for every equality mask.
+
+    Returns:
+        tuple[int, int]: An ACTIONCODE and the ACTIONDURATION to hold it for.
+    """
+    assert game_area.shape == (GA_H, GA_W), f"Unexpected game area shape {game_area.shape}"
+
+    # Locate every tracked element in a single pass over the non-empty cells of the game area
+    ys, xs = np.nonzero(game_area)
+    values = game_area[ys, xs]
+    positions = {}
+    for element in GameElements.TRACKED:
+        hits = values == element
+        positions[element] = (xs[hits], ys[hits])
+
+    mario_pos = first_position(game_area, GameElements.MARIO, mask)
+    mario_x, mario_y = mario_pos if mario_pos else (0, 0)
+    pipe_pos = first_position(game_area, GameElements.PIPE, mask)
+
+    #goomba, koopa and jumping_mob checks
+    for rule in ENEMY_RULES:
+        if rule_matches(positions, rule, mario_x, mario_y):
+            return rule[4], rule[5]
+
+    #flying_mob check - the first flying mob that is level with or just ahead of Mario decides
+    flying_mob_xs, flying_mob_ys = positions[GameElements.FLYING_MOB]
+    flying_mob_level = flying_mob_ys == mario_y
+    flying_mob_ahead = (flying_mob_xs > mario_x) & (flying_mob_xs <= mario_x + MARIO_POV + 2)
+    flying_mob_hit = flying_mob_level | flying_mob_ahead
+    if flying_mob_hit.any():
+        if flying_mob_level[np.argmax(flying_mob_hit)]:
+            return ACTIONCODE.back, ACTIONDURATION.medium
+        return ACTIONCODE.long_jump, ACTIONDURATION.medium
+
+    #pipe check
+    if pipe_pos:
+        pipe_x, pipe_y = pipe_pos
+        goomba_xs, _ = positions[GameElements.GOOMBA]
+
+        # Tall Pipe is in front of Mario with goomba on top wait for the goomba to move
+        if (pipe_x == 13 and pipe_y == 7) and goomba_xs.size and (goomba_xs[-1] > mario_x):
+            return ACTIONCODE.no_action, ACTIONDURATION.medium
+
+        if (mario_x + 4) == pipe_x:
+            if -2 <= pipe_y - mario_y <= 2:
+                return ACTIONCODE.long_jump, ACTIONDURATION.medium      
+        elif (mario_x + 2) == pipe_x:
+            if -2 <= pipe_y - mario_y <= 2:
+                return ACTIONCODE.long_jump, ACTIONDURATION.medium
+    
+     # if hole in front of mario, long jump
+    if ((mario_y + 2) < GA_H) and ((mario_x + 2) < GA_W):
+        if game_area[mario_y + 2, mario_x + 2] == 0 and game_area[GA_H - 1, mario_x + 2] == 0:  # Check for a hole two steps ahead
+            return ACTIONCODE.long_jump, ACTIONDURATION.short
+        
+    #block check
+    if rule_matches(positions, BLOCK_RULE, mario_x, mario_y):
+        return BLOCK_RULE[4], BLOCK_RULE[5]
+
+    # If no obstacle detected, move right
+    return ACTIONCODE.forward, ACTIONDURATION.medium
 
 
 class MarioController(MarioEnvironment):
@@ -84,6 +201,24 @@ class MarioController(MarioEnvironment):
         self.valid_actions = valid_actions
         self.release_button = release_button
 
+        # Indices of the buttons used by the expert - constant for the lifetime of the controller
+        self.ACT_RIGHT = valid_actions.index(WindowEvent.PRESS_ARROW_RIGHT)
+        self.ACT_JUMP = valid_actions.index(WindowEvent.PRESS_BUTTON_A)
+        self.ACT_LEFT = valid_actions.index(WindowEvent.PRESS_ARROW_LEFT)
+        self.ACT_LONG_JUMP = [self.ACT_RIGHT, self.ACT_JUMP]
+
+        # pyboy 2.x can advance several frames in one tick(count) call - fall back to looping on older versions
+        try:
+            batched_tick = "count" in inspect.signature(self.pyboy.tick).parameters
+        except (TypeError, ValueError):
+            batched_tick = False
+        self._tick_batch = self.pyboy.tick if batched_tick else self._tick_loop
+
+    def _tick_loop(self, count: int) -> None:
+        tick = self.pyboy.tick
+        for _ in range(count):
+            tick()
+
     def run_action(self, action, duration : int) -> None:
         """
         This is a very basic example of how this function could be implemented
@@ -93,23 +228,29 @@ class MarioController(MarioEnvironment):
         You can change the action type to whatever you want or need just remember the base control of the game is pushing buttons
         """
 
-        if not isinstance(action, list):
-            action = [action]
-
         if duration == ACTIONDURATION.no_action:
-            for _ in range(self.act_freq):
-                self.pyboy.tick()
+            self._tick_batch(self.act_freq)
             return
-        
+
+        valid_actions = self.valid_actions
+        release_button = self.release_button
+        send_input = self.pyboy.send_input
+
+        # Single button press - the common case, so skip wrapping it in a list
+        if type(action) is int:
+            send_input(valid_actions[action])
+            self._tick_batch(duration)
+            send_input(release_button[action])
+            return
+
         for act in action:
             # Simply toggles the buttons being on or off for a duration of act_freq
-            self.pyboy.send_input(self.valid_actions[act])
-        
-        for _ in range(duration):
-            self.pyboy.tick()
-        
+            send_input(valid_actions[act])
+
+        self._tick_batch(duration)
+
         for act in action:
-            self.pyboy.send_input(self.release_button[act])
+            send_input(release_button[act])
 
 
 
@@ -131,97 +272,36 @@ class MarioExpert:
 
         self.environment = MarioController(headless=headless)
 
+        # Maps the decision codes onto the controller's button indices
+        self.actions = {
+            ACTIONCODE.forward: self.environment.ACT_RIGHT,
+            ACTIONCODE.jump: self.environment.ACT_JUMP,
+            ACTIONCODE.long_jump: self.environment.ACT_LONG_JUMP,
+            ACTIONCODE.back: self.environment.ACT_LEFT,
+            ACTIONCODE.no_action: ACTIONDURATION.no_action,
+        }
+
+        # decide_action only depends on the game area, so the last decision is reused until the screen changes
+        self._last_game_area = None
+        self._last_decision = None
+
+        # Scratch buffer shared by every equality mask decide_action builds over the game area
+        self._mask_buf = np.empty((GA_H, GA_W), dtype=np.bool_)
+
         self.video = None
 
     def choose_action(self):
-        state = self.environment.game_state()
-        frame = self.environment.grab_frame()
-        game_area = self.environment.game_area()
-
-        #actions
-        move_forward_action = self.environment.valid_actions.index(WindowEvent.PRESS_ARROW_RIGHT)
-        jump_action = self.environment.valid_actions.index(WindowEvent.PRESS_BUTTON_A)
-        long_jump_action = [move_forward_action, jump_action]
-        move_backward_action = self.environment.valid_actions.index(WindowEvent.PRESS_ARROW_LEFT)
-
-        def get_element_positions(game_area=game_area, element=GameElements.MARIO):
-            element_positions = np.argwhere(game_area == element)
-            if element_positions.size > 0:
-                return [(pos[1], pos[0]) for pos in element_positions]
-            return []
-        
-        # Get the position of the elements
-        mario_pos = get_element_positions(game_area, GameElements.MARIO)
-        mario_x, mario_y = mario_pos[0] if mario_pos else (0,0)
-        goomba_pos = get_element_positions(game_area, GameElements.GOOMBA)
-        koopa_pos = get_element_positions(game_area, GameElements.KOOPA)
-        pipe_pos = get_element_positions(game_area, GameElements.PIPE)
-        block_pos = get_element_positions(game_area, GameElements.BLOCK)
-        jumping_mob_pos = get_element_positions(game_area, GameElements.JUMPING_MOB)
-        flying_mob_pos = get_element_positions(game_area, GameElements.FLYING_MOB)
-        mystery_pos = get_element_positions(game_area, GameElements.MYSTERY)
-        print(mystery_pos)
-        mario_pov = 2
-
-        #goomba check
-        if goomba_pos:
-            for goomba_x, goomba_y in goomba_pos:
-                if ((mario_x + mario_pov) >= goomba_x) and (goomba_x > mario_x):
-                    if abs(mario_y - goomba_y) == 1:
-                        return long_jump_action, ACTIONDURATION.long
-                    
-        #koopa check
-        if koopa_pos:
-            for koopa_x, koopa_y in koopa_pos:
-                if ((mario_x + mario_pov) >= koopa_x) and (koopa_x > mario_x):
-                    if abs(mario_y - koopa_y) == 1:
-                        return long_jump_action, ACTIONDURATION.medium
-        
-        #jumping_mob check
-        if jumping_mob_pos:
-            for jumping_mob_x, jumping_mob_y in jumping_mob_pos:
-                if ((mario_x + (mario_pov + 2)) >= jumping_mob_x) and (jumping_mob_x > mario_x):
-                    if abs(mario_y - jumping_mob_y) == 2:
-                        return jump_action, ACTIONDURATION.medium
-        
-        if flying_mob_pos:
-            for flying_mob_x, flying_mob_y in flying_mob_pos:
-                if (mario_y - flying_mob_y) == 0:
-                    return move_backward_action, ACTIONDURATION.medium
-                elif ((mario_x + mario_pov + 2) >= flying_mob_x) and (flying_mob_x > mario_x):
-                    return long_jump_action, ACTIONDURATION.medium
-                
-        #pipe check
-        if pipe_pos:
-            pipe_x, pipe_y = pipe_pos[0]    
-
-            # Tall Pipe is in front of Mario with goomba on top wait for the goomba to move
-            if (pipe_x == 13 and pipe_y == 7) and (goomba_x > mario_x):
-                return ACTIONDURATION.no_action, ACTIONDURATION.medium
-
-            if (mario_x + 4) == pipe_x:
-                if abs(mario_y - pipe_y) <= 2:
-                    return long_jump_action, ACTIONDURATION.medium      
-            elif (mario_x + 2) == pipe_x:
-                if abs(mario_y - pipe_y) <= 2:
-                    return long_jump_action, ACTIONDURATION.medium
-        
-         # if hole in front of mario, long jump
-        if ((mario_y + 2) < game_area.shape[0]) and ((mario_x + 2) < game_area.shape[1]):
-            if game_area[mario_y + 2][mario_x + 2] == 0 and game_area[15][mario_x + 2] == 0:  # Check for a hole two steps ahead
-                return long_jump_action, ACTIONDURATION.short
-            
-         #block check
-        if block_pos:
-            for block_x, block_y in block_pos:
-                # Case 1: Block is directly in front of Mario (obstacle)
-                if (mario_x + mario_pov) == block_x:
-                    if abs(mario_y - block_y) == 1:
-                        return long_jump_action, ACTIONDURATION.short     
-        # time.sleep(0.1)
-
-        # If no obstacle detected, move right
-        return move_forward_action, ACTIONDURATION.medium
+        # Every game element code fits in a byte - scanning int8 touches far less memory than the wide ints pyboy returns
+        game_area = self.environment.game_area().astype(np.int8, copy=False)
+
+        game_area_key = game_area.tobytes()
+        if game_area_key == self._last_game_area:
+            return self._last_decision
+
+        action_code, duration = decide_action(game_area, self._mask_buf)
+        self._last_game_area = game_area_key
+        self._last_decision = self.actions[action_code], duration
+        return self._last_decision
 
     def step(self):
         """